@@ -2,97 +2,335 @@
 
 Users choose an area and categories, then run a Playwright-based scraper.
 The app shows a clear status panel, progress logs, result preview, and
-download buttons for Excel and CSV. Defensive casting is used to avoid
-type issues with st_folium return values.
+download buttons for Excel, CSV and Parquet. Defensive casting is used to
+avoid type issues with st_folium return values.
 """
 
 from __future__ import annotations
 
+import atexit
+import functools
 import io
 import os
+import queue
+import sqlite3
+import threading
+import time
+import unicodedata
 import datetime
 import logging
-from typing import List, Optional, Tuple, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Deque, List, Optional, Tuple, Union
 
 import math
 import pandas as pd
+import pgeocode
 import streamlit as st
+import xlsxwriter
 import folium
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit_folium import st_folium
 from geopy.geocoders import Nominatim
 
 from selectors_def import DEFAULT_CATEGORIES
 from scraper import scrape_locations, ScrapeResult
+from utils import extract_postcode, haversine_distance
 
 
 # ----------------------------- helpers --------------------------------------
 def _as_float(x: Union[str, float, int, None]) -> Optional[float]:
+    # st_folium already returns floats; only strings need parsing
+    if isinstance(x, float):
+        return x
+    if isinstance(x, int):
+        return float(x)
+    if x is None:
+        return None
     try:
-        return float(x) if x is not None else None
+        return float(x)
     except (TypeError, ValueError):
         return None
 
 
-def geocode_address(query: str) -> Tuple[float, float]:
+def _extract_center(centre) -> Tuple[Optional[float], Optional[float]]:
+    # st_folium reports {"lat": ..., "lng": ...}; other shapes are rare
+    try:
+        return float(centre["lat"]), float(centre["lng"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    if isinstance(centre, dict):
+        return (
+            _as_float(centre.get("lat") or centre.get("latitude")),
+            _as_float(centre.get("lng") or centre.get("lon") or centre.get("longitude")),
+        )
+    if isinstance(centre, (list, tuple)) and len(centre) == 2:
+        return _as_float(centre[0]), _as_float(centre[1])
+    return None, None
+
+
+@st.cache_resource(show_spinner=False)
+def _geolocator() -> Nominatim:
+    # One geolocator (and HTTP session) shared by every rerun and session
+    return Nominatim(user_agent="rokesuma_app", timeout=5)
+
+
+@st.cache_resource(show_spinner=False)
+def _postal_index() -> Optional[pgeocode.Nominatim]:
+    # The GeoNames table is downloaded once; without it we use Nominatim only
     try:
-        geo = Nominatim(user_agent="rokesuma_app")
-        loc = geo.geocode(query)
-        if loc:
-            return float(loc.latitude), float(loc.longitude)
+        return pgeocode.Nominatim("jp")
     except Exception:
+        return None
+
+
+def _geocode_postcode(query: str) -> Optional[Tuple[float, float]]:
+    postcode = extract_postcode(query)
+    index = _postal_index() if postcode else None
+    if index is None:
+        return None
+    rec = index.query_postal_code(postcode)
+    lat, lon = _as_float(rec.latitude), _as_float(rec.longitude)
+    if lat is None or lon is None or math.isnan(lat) or math.isnan(lon):
+        return None
+    return lat, lon
+
+
+_GEOCACHE_PATH = os.path.join(os.path.dirname(__file__), ".geocache.sqlite3")
+_GEOCACHE_TTL = 30 * 86400
+
+
+@st.cache_resource(show_spinner=False)
+def _geocache() -> Tuple[sqlite3.Connection, threading.Lock]:
+    # Persists Nominatim answers across app restarts (OSM rate-limits us)
+    conn = sqlite3.connect(_GEOCACHE_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS geocode (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+    )
+    return conn, threading.Lock()
+
+
+def _geocache_get(key: str) -> Optional[str]:
+    try:
+        conn, lock = _geocache()
+        with lock:
+            row = conn.execute(
+                "SELECT value FROM geocode WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+
+
+def _geocache_set(key: str, value: str) -> None:
+    try:
+        conn, lock = _geocache()
+        with lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?)",
+                (key, value, time.time() + _GEOCACHE_TTL),
+            )
+    except sqlite3.Error:
         pass
-    # fallback: Fukuoka Station
-    return 33.5902, 130.4200
+
+
+# The cached lookups raise on failure so st.cache_data keeps only
+# successful answers; the wrappers below apply the fallbacks uncached.
+@st.cache_data(show_spinner=False, ttl=86400, max_entries=10000)
+def _geocode_cached(query: str) -> Tuple[float, float]:
+    coords = _geocode_postcode(query)
+    if coords:
+        return coords
+    cached = _geocache_get(f"q:{query}")
+    if cached:
+        lat_s, lon_s = cached.split(",")
+        return float(lat_s), float(lon_s)
+    loc = _geolocator().geocode(query)
+    if not loc:
+        raise LookupError(query)
+    _geocache_set(f"q:{query}", f"{loc.latitude},{loc.longitude}")
+    return float(loc.latitude), float(loc.longitude)
+
+
+def geocode_address(query: str) -> Tuple[float, float]:
+    # NFKC + strip so "東京駅 " and "東京駅" share one cache entry
+    try:
+        return _geocode_cached(unicodedata.normalize("NFKC", query).strip())
+    except Exception:
+        # fallback: Fukuoka Station
+        return 33.5902, 130.4200
+
+
+@st.cache_data(show_spinner=False, ttl=86400, max_entries=10000)
+def _reverse_geocode_cached(lat: float, lon: float) -> str:
+    key = f"r:{lat:.5f},{lon:.5f}"
+    cached = _geocache_get(key)
+    if cached:
+        return cached
+    loc = _geolocator().reverse((lat, lon), exactly_one=True)
+    if not (loc and loc.address):
+        raise LookupError(key)
+    _geocache_set(key, loc.address)
+    return loc.address
 
 
 def reverse_geocode(lat: float, lon: float) -> str:
+    # Quantise to ~1 m so nearby map centres share a cache entry
+    lat, lon = round(lat, 5), round(lon, 5)
     try:
-        geo = Nominatim(user_agent="rokesuma_app")
-        loc = geo.reverse((lat, lon), exactly_one=True)
-        if loc and loc.address:
-            return loc.address
+        return _reverse_geocode_cached(lat, lon)
     except Exception:
-        pass
-    return f"{lat:.5f},{lon:.5f}"
+        return f"{lat:.5f},{lon:.5f}"
+
+
+# m/px at z0 (156543.03392) times ~800px viewport half-width (400px)
+_RADIUS_K = 156543.03392 * 400
+
+
+@functools.lru_cache(maxsize=4096)
+def _radius(lat_q: int, zoom: int) -> float:
+    return _RADIUS_K * math.cos(math.radians(lat_q / 1e4)) / float(1 << zoom)
 
 
 def estimate_radius_m(lat: float, zoom: int) -> float:
-    base_res = 156543.03392  # m/px at z0
-    mpp = base_res * math.cos(math.radians(lat)) / (2 ** zoom)
-    return mpp * 400  # ~800px viewport half-width
+    # Latitude quantised to 1e-4 deg (~11 m); the caption rounds to metres
+    return _radius(int(lat * 1e4), int(zoom))
+
+
+# Map pans shorter than this keep the current centre
+_PAN_THRESHOLD_M = 50.0
+
 
+def _session_id() -> str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
 
-def setup_logging() -> logging.Logger:
+
+def _default_session_id(record: logging.LogRecord) -> bool:
+    if not hasattr(record, "session_id"):
+        record.session_id = "-"
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def _log_queue() -> "queue.Queue[logging.LogRecord]":
+    # One file per process, shared by every session and rolled over at
+    # midnight (app.log.YYYY-MM-DD). The scraper logs from its marker loop;
+    # a background thread does the disk writes so they never stall the
+    # script thread.
     logs_dir = os.path.join(os.path.dirname(__file__), "logs")
     os.makedirs(logs_dir, exist_ok=True)
-    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    logfile = os.path.join(logs_dir, f"app_{ts}.log")
-
+    logfile = os.path.join(logs_dir, "app.log")
+
+    fh = TimedRotatingFileHandler(logfile, when="midnight", backupCount=30, encoding="utf-8")
+    fh.setFormatter(
+        logging.Formatter("%(asctime)s - %(levelname)s - [%(session_id)s] %(message)s")
+    )
+    # Records that bypass setup_logging's adapter have no session ID
+    # (Formatter's defaults= needs Python 3.10; the README allows 3.9)
+    fh.addFilter(_default_session_id)
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    listener = QueueListener(log_queue, fh)
+    listener.start()
+    atexit.register(listener.stop)
+    return log_queue
+
+
+@st.cache_resource(show_spinner=False)
+def _app_logger() -> logging.Logger:
+    # Shared by every session; records carry the session ID instead
     logger = logging.getLogger("rokesuma_app")
     logger.setLevel(logging.INFO)
-    for h in list(logger.handlers):
-        logger.removeHandler(h)
-
-    fmt = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    fh = logging.FileHandler(logfile, encoding="utf-8")
-    fh.setFormatter(fmt)
-    logger.addHandler(fh)
+    if not any(isinstance(h, QueueHandler) for h in logger.handlers):
+        logger.addHandler(QueueHandler(_log_queue()))
     return logger
 
 
+def setup_logging(session_id: str) -> logging.LoggerAdapter:
+    return logging.LoggerAdapter(_app_logger(), {"session_id": session_id})
+
+
+def _column_widths(df: pd.DataFrame) -> List[int]:
+    widths = []
+    for col in df.columns:
+        # Missing values stay missing under astype(str) on newer pandas, so
+        # an all-None column (e.g. 距離_m without an origin) has no length
+        longest = df[col].astype(str).str.len().fillna(0).max() if len(df) else 0
+        widths.append(max(int(longest), len(str(col))) + 2)
+    return widths
+
+
+def _frame_digest(df: pd.DataFrame) -> Tuple[Tuple[str, ...], bytes]:
+    return tuple(map(str, df.columns)), pd.util.hash_pandas_object(df, index=False).values.tobytes()
+
+
+# Re-running an identical scrape returns the workbook already built
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: _frame_digest})
 def dataframe_to_excel_bytes(df: pd.DataFrame) -> bytes:
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="data")
-        ws = writer.sheets["data"]
-        for i, col in enumerate(df.columns, start=1):
-            max_len = max([len(str(x)) for x in df[col].tolist()] + [len(col)])
-            ws.column_dimensions[chr(64 + i)].width = max_len + 2
+    # constant_memory flushes each row as soon as the next one starts, so
+    # rows must be written strictly in order (pandas' to_excel writes
+    # column by column and would lose data in this mode).
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    ws = workbook.add_worksheet("data")
+    for i, width in enumerate(_column_widths(df)):
+        ws.set_column(i, i, width)
+    header_fmt = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+    ws.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+    body = df.astype(object).where(df.notna(), None)
+    for r, row in enumerate(body.itertuples(index=False, name=None), start=1):
+        ws.write_row(r, 0, row)
+    workbook.close()
     return output.getvalue()
 
 
+@st.cache_resource(show_spinner=False)
+def _export_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=3, thread_name_prefix="export")
+
+
+class _LiveLogHandler(logging.Handler):
+    """Mirror scrape progress into a placeholder at most every ``interval`` s.
+
+    Re-rendering on every record would send one websocket delta and
+    re-join the whole log per line; batching keeps both bounded.
+    """
+
+    def __init__(
+        self, placeholder, session_id: str, interval: float = 0.25, maxlen: int = 100
+    ) -> None:
+        super().__init__()
+        # The app logger is shared, so only mirror this session's records
+        self.addFilter(lambda record: getattr(record, "session_id", None) == session_id)
+        self.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%H:%M:%S"))
+        self.placeholder = placeholder
+        self.interval = interval
+        self.lines: Deque[str] = deque(maxlen=maxlen)
+        self._last_render = 0.0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.lines.append(self.format(record))
+        if time.monotonic() - self._last_render > self.interval:
+            self.render()
+
+    def render(self) -> None:
+        self._last_render = time.monotonic()
+        self.placeholder.code("\n".join(self.lines), language=None)
+
+
 def dataframe_to_csv_bytes(df: pd.DataFrame) -> bytes:
-    return df.to_csv(index=False).encode("utf-8-sig")
+    # Encode chunk by chunk into the buffer instead of building one big str
+    output = io.BytesIO()
+    df.to_csv(output, index=False, encoding="utf-8-sig", chunksize=10_000)
+    return output.getvalue()
+
+
+def dataframe_to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    # Columnar + zstd: far smaller and faster to write than xlsx for big results
+    output = io.BytesIO()
+    df.to_parquet(output, engine="pyarrow", compression="zstd", index=False)
+    return output.getvalue()
 
 
 # ----------------------------------- UI -------------------------------------
@@ -114,6 +352,10 @@ def main() -> None:
         st.session_state.zoom = 13
     else:
         st.session_state.zoom = int(st.session_state.zoom)
+    # Typed once here; session_state is only written back on real changes
+    lat: float = st.session_state.lat
+    lon: float = st.session_state.lon
+    zoom: int = st.session_state.zoom
 
     col1, col2 = st.columns([1, 2], gap="small")
 
@@ -126,29 +368,32 @@ def main() -> None:
         )
         if new_address != st.session_state.address and new_address.strip():
             st.session_state.address = new_address
+            st.session_state.address_dirty = False
             lat_tmp, lon_tmp = geocode_address(new_address)
-            st.session_state.lat, st.session_state.lon = float(lat_tmp), float(lon_tmp)
+            lat, lon = float(lat_tmp), float(lon_tmp)
+            st.session_state.lat, st.session_state.lon = lat, lon
 
         zoom_val = st.number_input(
             "ズームレベル (8〜18)", min_value=8, max_value=18,
-            value=int(st.session_state.zoom), step=1,
+            value=zoom, step=1,
             help="地図のズームレベルを指定します。"
         )
-        if zoom_val != st.session_state.zoom:
-            st.session_state.zoom = int(zoom_val)
+        if zoom_val != zoom:
+            zoom = int(zoom_val)
+            st.session_state.zoom = zoom
 
-        approx_radius = estimate_radius_m(float(st.session_state.lat), int(st.session_state.zoom))
+        approx_radius = estimate_radius_m(lat, zoom)
         st.caption(f"\U0001F4CD このズームレベルの範囲: 半径約 {approx_radius:,.0f} m")
 
-        category_options = DEFAULT_CATEGORIES
         categories: List[str] = st.multiselect(
             "カテゴリ (複数選択可)",
-            options=category_options,
-            default=[category_options[0]] if category_options else [],
+            options=DEFAULT_CATEGORIES,
+            default=[DEFAULT_CATEGORIES[0]] if DEFAULT_CATEGORIES else [],
             help="抽出したいカテゴリを選択してください。"
         )
         if "病院・診療所" in categories:
-            categories = [c for c in categories if c != "病院・診療所"] + ["病院・診療所"]
+            categories.remove("病院・診療所")
+            categories.append("病院・診療所")
 
         headless = st.checkbox("ヘッドレスモード", value=True)
 
@@ -169,46 +414,41 @@ def main() -> None:
     with col2:
         # Map
         try:
-            m = folium.Map(
-                location=[float(st.session_state.lat), float(st.session_state.lon)],
-                zoom_start=int(st.session_state.zoom),
-            )
+            m = folium.Map(location=[lat, lon], zoom_start=zoom)
             folium.Marker(
-                [float(st.session_state.lat), float(st.session_state.lon)],
+                [lat, lon],
                 tooltip="中心", popup="中心",
             ).add_to(m)
 
-            map_output = st_folium(m, key="folium_map", width="100%", height=400)
+            # Only the centre and zoom are read back; skip bounds, clicks, drawings
+            map_output = st_folium(
+                m, key="folium_map", width="100%", height=400,
+                returned_objects=["center", "zoom"],
+            )
 
             if isinstance(map_output, dict):
                 centre = map_output.get("center")
                 new_zoom = map_output.get("zoom")
 
-                new_lat = new_lon = None
-                if isinstance(centre, dict):
-                    new_lat = _as_float(centre.get("lat") or centre.get("latitude"))
-                    new_lon = _as_float(centre.get("lng") or centre.get("lon") or centre.get("longitude"))
-                elif isinstance(centre, (list, tuple)) and len(centre) == 2:
-                    new_lat = _as_float(centre[0])
-                    new_lon = _as_float(centre[1])
-
-                prev_lat = _as_float(st.session_state.lat)
-                prev_lon = _as_float(st.session_state.lon)
-
-                if (
-                    new_lat is not None and new_lon is not None
-                    and prev_lat is not None and prev_lon is not None
-                ):
-                    if abs(new_lat - prev_lat) > 1e-6 or abs(new_lon - prev_lon) > 1e-6:
-                        st.session_state.lat = float(new_lat)
-                        st.session_state.lon = float(new_lon)
-                        st.session_state.address = reverse_geocode(float(new_lat), float(new_lon))
+                new_lat, new_lon = _extract_center(centre)
+
+                if new_lat is not None and new_lon is not None:
+                    moved_m, _ = haversine_distance(lat, lon, new_lat, new_lon)
+                    if moved_m > _PAN_THRESHOLD_M:
+                        lat, lon = new_lat, new_lon
+                        st.session_state.lat = lat
+                        st.session_state.lon = lon
+                        # Show the raw centre until the user runs a scrape;
+                        # reverse geocoding every pan would block each rerun.
+                        st.session_state.address = f"{new_lat:.5f},{new_lon:.5f}"
+                        st.session_state.address_dirty = True
 
                 if new_zoom is not None:
                     try:
                         new_zoom_int = int(new_zoom)
-                        if new_zoom_int != int(st.session_state.zoom):
-                            st.session_state.zoom = new_zoom_int
+                        if new_zoom_int != zoom:
+                            zoom = new_zoom_int
+                            st.session_state.zoom = zoom
                     except Exception:
                         pass
 
@@ -220,49 +460,61 @@ def main() -> None:
     status_placeholder = st.empty()
     log_placeholder = st.empty()
     table_placeholder = st.empty()
-    dl_col = st.columns(2)
+    dl_col = st.columns(3)
 
     if execute:
-        logger = setup_logging()
+        # A new run replaces whatever the previous one left on screen
+        st.session_state.pop("last_result", None)
+        session_id = _session_id()
+        logger = setup_logging(session_id)
+        if st.session_state.get("address_dirty"):
+            st.session_state.address = reverse_geocode(lat, lon)
+            st.session_state.address_dirty = False
+        logger.info(f"中心住所: {st.session_state.address}")
         with st.status("準備中…", expanded=True) as s:
             try:
                 s.update(label="抽出を実行中…", state="running")
-                coord_address = f"{float(st.session_state.lat)},{float(st.session_state.lon)}"
-                result: ScrapeResult = scrape_locations(
-                    address=coord_address,
-                    zoom=int(st.session_state.zoom),
-                    categories=categories,
-                    headless=headless,
-                    max_count=max_count,
-                    logger=logger,
-                )
+                coord_address = f"{lat},{lon}"
+                live_log = _LiveLogHandler(log_placeholder, session_id)
+                logger.logger.addHandler(live_log)
+                try:
+                    result: ScrapeResult = scrape_locations(
+                        address=coord_address,
+                        zoom=zoom,
+                        categories=categories,
+                        headless=headless,
+                        max_count=max_count,
+                        logger=logger,
+                    )
+                finally:
+                    logger.logger.removeHandler(live_log)
                 log_text = "\n".join(result.log_lines) if result.log_lines else "(ログなし)"
                 log_placeholder.text_area("進捗ログ", log_text, height=220)
 
                 if not result.dataframe.empty:
+                    # Serialise the exports while the table is being drawn
+                    pool = _export_pool()
+                    excel_future = pool.submit(dataframe_to_excel_bytes, result.dataframe)
+                    csv_future = pool.submit(dataframe_to_csv_bytes, result.dataframe)
+                    parquet_future = pool.submit(dataframe_to_parquet_bytes, result.dataframe)
                     s.update(label="完了しました", state="complete")
                     st.success(f"{len(result.dataframe)} 件のデータを取得しました。")
                     table_placeholder.dataframe(result.dataframe, use_container_width=True)
 
-                    excel_bytes = dataframe_to_excel_bytes(result.dataframe)
-                    csv_bytes = dataframe_to_csv_bytes(result.dataframe)
-                    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                    base = f"ロケスマ抽出_{ts}"
-
-                    with dl_col[0]:
-                        st.download_button(
-                            "Excel ダウンロード",
-                            data=excel_bytes,
-                            file_name=f"{base}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        )
-                    with dl_col[1]:
-                        st.download_button(
-                            "CSV ダウンロード",
-                            data=csv_bytes,
-                            file_name=f"{base}.csv",
-                            mime="text/csv",
-                        )
+                    if not excel_future.done():
+                        with st.spinner("Excel ファイルを作成中…"):
+                            excel_future.result()
+
+                    # Kept across reruns so later widget changes don't lose
+                    # the table or force another scrape to download it
+                    st.session_state.last_result = {
+                        "df": result.dataframe,
+                        "xlsx": excel_future.result(),
+                        "csv": csv_future.result(),
+                        "parquet": parquet_future.result(),
+                        "ts": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+                        "log": log_text,
+                    }
                 else:
                     s.update(label="完了（データなし）", state="complete")
                     st.warning("データが取得できませんでした。条件を変えてお試しください。")
@@ -272,6 +524,38 @@ def main() -> None:
                 st.error("抽出中にエラーが発生しました。以下をご確認ください。")
                 st.exception(e)
 
+    last = st.session_state.get("last_result")
+    if last is not None:
+        if not execute:
+            log_placeholder.text_area("進捗ログ", last["log"], height=220)
+            table_placeholder.dataframe(last["df"], use_container_width=True)
+
+        base = f"ロケスマ抽出_{last['ts']}"
+        with dl_col[0]:
+            st.download_button(
+                "Excel ダウンロード",
+                data=last["xlsx"],
+                file_name=f"{base}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                on_click="ignore",
+            )
+        with dl_col[1]:
+            st.download_button(
+                "CSV ダウンロード",
+                data=last["csv"],
+                file_name=f"{base}.csv",
+                mime="text/csv",
+                on_click="ignore",
+            )
+        with dl_col[2]:
+            st.download_button(
+                "Parquet ダウンロード",
+                data=last["parquet"],
+                file_name=f"{base}.parquet",
+                mime="application/vnd.apache.parquet",
+                on_click="ignore",
+            )
+
 
 if __name__ == "__main__":
     main()
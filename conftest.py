@@ -0,0 +1,19 @@
+"""Shared fixtures for the smoke tests.
+
+The scraper keeps one headless browser per process, so the first smoke
+test pays for the launch and the rest reuse it.  The session fixture
+below closes that browser once every test has finished instead of
+leaving it to interpreter shutdown.
+"""
+
+from typing import Iterator
+
+import pytest
+
+import scraper
+
+
+@pytest.fixture(scope="session", autouse=True)
+def shared_browser() -> Iterator[None]:
+    yield
+    scraper.close_browser()
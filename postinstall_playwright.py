@@ -12,6 +12,7 @@ will download its browser bundles into the specified directory instead of
 `~/.cache/playwright`.
 """
 
+import glob
 import os
 import subprocess
 import sys
@@ -28,6 +29,12 @@ def main() -> None:
     browsers_path = os.environ.get("PLAYWRIGHT_BROWSERS_PATH", "./ms-playwright")
     os.makedirs(browsers_path, exist_ok=True)
 
+    # Skip the (slow) installer subprocess when a Chromium bundle is already
+    # present, so repeated runs are cheap.
+    if glob.glob(os.path.join(browsers_path, "chromium-*")):
+        print("Chromium already installed; skipping.")
+        return
+
     # Run the install command.  This downloads the Chromium browser package.
     try:
         subprocess.run([
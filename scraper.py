@@ -2,7 +2,7 @@
 
 This module encapsulates all browser automation using Playwright.  It
 exposes a single entry point `scrape_locations` which accepts search
-parameters, launches a Chromium instance (honouring the headless flag)
+parameters, reuses a shared Chromium instance (honouring the headless flag)
 and programmatically interacts with the ロケスマ web app.  For each
 selected category the scraper clicks markers on the map one by one and
 extracts structured information from the detail panel or popup.  Where
@@ -18,15 +18,20 @@ presenting log messages to the user.
 from __future__ import annotations
 
 import asyncio
+import atexit
 import datetime
 import logging
 import os
+import queue
 import sys
 import subprocess
-from dataclasses import dataclass
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional, Dict, Tuple, Any
+from typing import Callable, List, Optional, Dict, Set, Tuple, Any, Union
 
+import numpy as np
 import pandas as pd
 from tenacity import retry, stop_after_attempt, wait_fixed
 from playwright.async_api import async_playwright
@@ -42,16 +47,17 @@ from selectors_def import (
     ADDRESS_SELECTORS,
     PHONE_SELECTORS,
     HOURS_SELECTORS,
+    PANEL_SELECTORS,
     DEFAULT_CATEGORIES,
 )
 
 from utils import (
     extract_phone,
-    extract_address,
     extract_hours,
+    extract_fields,
+    normalize_key,
     parse_coords_from_url,
-    haversine_distance,
-    unique_by_name_address,
+    haversine_distance_vector,
 )
 
 # ---------------------------------------------------------------------------
@@ -67,6 +73,10 @@ BASE_DIR = Path(__file__).resolve().parent
 PLAYWRIGHT_DIR = BASE_DIR / "ms-playwright"
 # Persist browsers under the repository so they survive app restarts
 os.environ.setdefault("PLAYWRIGHT_BROWSERS_PATH", str(PLAYWRIGHT_DIR))
+# Set once Chromium is known to be present; later scrapes skip the check
+_CHROMIUM_READY = False
+# Written after a completed install so later processes need a single stat
+_READY_MARKER = PLAYWRIGHT_DIR / ".ready"
 
 
 def _run(cmd: List[str]) -> None:
@@ -74,19 +84,31 @@ def _run(cmd: List[str]) -> None:
     subprocess.run(cmd, check=True)
 
 
-def ensure_chromium(logger: Optional[logging.Logger] = None) -> None:
+def ensure_chromium(
+    logger: Optional[Union[logging.Logger, logging.LoggerAdapter]] = None,
+) -> None:
     """Ensure that a Chromium browser is available for Playwright.
 
     - Installs Chromium into ./ms-playwright if not present.
     - Uses the *current* Python interpreter to invoke Playwright so that
       venv/path issues cannot cause 'command not found'.
+    - Checks the filesystem only once per process, starting with the
+      ``.ready`` marker left by a previous install.
     """
+    global _CHROMIUM_READY
+    if _CHROMIUM_READY:
+        return
+    if _READY_MARKER.is_file():
+        _CHROMIUM_READY = True
+        return
     try:
         PLAYWRIGHT_DIR.mkdir(parents=True, exist_ok=True)
         # Quick presence check: any chromium-* folder under PLAYWRIGHT_DIR
         if any(PLAYWRIGHT_DIR.glob("chromium-*")):
             if logger:
                 logger.info("[setup] Chromium already present in ms-playwright.")
+            _READY_MARKER.touch()
+            _CHROMIUM_READY = True
             return
 
         if logger:
@@ -94,6 +116,8 @@ def ensure_chromium(logger: Optional[logging.Logger] = None) -> None:
         _run([sys.executable, "-m", "playwright", "install", "chromium"])
         if logger:
             logger.info("[setup] Chromium install completed.")
+        _READY_MARKER.touch()
+        _CHROMIUM_READY = True
     except Exception as e:
         if logger:
             logger.error(f"[setup] Chromium install failed: {e}")
@@ -101,6 +125,80 @@ def ensure_chromium(logger: Optional[logging.Logger] = None) -> None:
         raise
 
 
+# ---------------------------------------------------------------------------
+# Shared browser
+#
+# Launching Chromium costs up to a couple of seconds, so one Playwright
+# instance and one browser per headless mode are kept alive for the whole
+# process.  Playwright objects are bound to the event loop that created
+# them, which is why every scrape runs on a single long-lived loop in a
+# background thread instead of a fresh ``asyncio.run`` loop.  Each scrape
+# only opens (and closes) its own BrowserContexts.
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+_PLAYWRIGHT: Any = None
+_BROWSERS: Dict[bool, Any] = {}
+_BROWSER_LOCK: Optional[asyncio.Lock] = None
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared Playwright event loop, starting it on first use."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="playwright-loop", daemon=True
+            ).start()
+            _LOOP = loop
+            atexit.register(close_browser)
+    return _LOOP
+
+
+async def _get_browser(headless: bool) -> Any:
+    """Return the shared browser for ``headless``, launching it if needed."""
+    global _PLAYWRIGHT, _BROWSER_LOCK
+    if _BROWSER_LOCK is None:
+        _BROWSER_LOCK = asyncio.Lock()
+    async with _BROWSER_LOCK:
+        browser = _BROWSERS.get(headless)
+        if browser is not None and browser.is_connected():
+            return browser
+        if _PLAYWRIGHT is None:
+            _PLAYWRIGHT = await async_playwright().start()
+        browser = await _PLAYWRIGHT.chromium.launch(headless=headless)
+        _BROWSERS[headless] = browser
+        return browser
+
+
+async def _close_browsers() -> None:
+    global _PLAYWRIGHT
+    for browser in list(_BROWSERS.values()):
+        try:
+            await browser.close()
+        except Exception:
+            pass
+    _BROWSERS.clear()
+    if _PLAYWRIGHT is not None:
+        await _PLAYWRIGHT.stop()
+        _PLAYWRIGHT = None
+
+
+def close_browser() -> None:
+    """Close the shared browsers and stop Playwright.
+
+    Registered with ``atexit``; safe to call more than once.  The next
+    scrape simply launches a new browser.
+    """
+    if _LOOP is None or not _LOOP.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close_browsers(), _LOOP).result(timeout=30)
+    except Exception:
+        pass
+
+
 @dataclass
 class ScrapeResult:
     """Container for the result of a scrape.
@@ -112,118 +210,309 @@ class ScrapeResult:
     log_lines : List[str]
         The list of log messages captured during the scrape.  Each
         message is prefixed with a timestamp to aid debugging.
+    log_entries : List[Tuple[float, str]]
+        The raw ``(time.time(), message)`` pairs.  When given without
+        ``log_lines`` the lines are formatted from them once, after the
+        scrape, rather than on every log call.
     """
 
     dataframe: pd.DataFrame
-    log_lines: List[str]
+    log_lines: List[str] = field(default_factory=list)
+    log_entries: List[Tuple[float, str]] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        if self.log_entries and not self.log_lines:
+            self.log_lines = [
+                f"[{time.strftime('%H:%M:%S', time.localtime(ts))}] {message}"
+                for ts, message in self.log_entries
+            ]
+
+
+# Detail-panel selector lists keyed by field, evaluated together in the page
+_FIELD_SELECTORS: Dict[str, List[str]] = {
+    "name": STORE_NAME_SELECTORS,
+    "address": ADDRESS_SELECTORS,
+    "phone": PHONE_SELECTORS,
+    "hours": HOURS_SELECTORS,
+}
+
+# Mirrors the old per-selector query_selector loops inside the browser.
+# Entries prefixed with ``xpath=`` are evaluated as XPath; selectors the
+# engine rejects are skipped.
+# The detail panel's text (the whole page only when no panel matches) and
+# the map centre ride along for the regex and coordinate fallbacks.
+_PICK_FIELDS_JS = """
+([fields, panels]) => {
+  const query = (sel) => {
+    if (sel.startsWith("xpath=")) {
+      return document.evaluate(
+        sel.slice(6), document, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null,
+      ).singleNodeValue;
+    }
+    return document.querySelector(sel);
+  };
+  const out = {};
+  out.text = "";
+  for (const sel of panels) {
+    let el = null;
+    try { el = query(sel); } catch (e) { continue; }
+    const text = el ? (el.innerText || "") : "";
+    if (text.trim()) { out.text = text; break; }
+  }
+  if (!out.text && document.body) out.text = document.body.innerText || "";
+  out.centre = (window.map && window.map.getCenter)
+    ? [window.map.getCenter().lat, window.map.getCenter().lng] : null;
+  for (const [key, sels] of Object.entries(fields)) {
+    out[key] = "";
+    for (const sel of sels) {
+      let el = null;
+      try { el = query(sel); } catch (e) { continue; }
+      const text = el ? (el.innerText || "").trim() : "";
+      if (text) { out[key] = text; break; }
+    }
+  }
+  return out;
+}
+"""
 
+# Number of markers matched by the first selector that matches any.
+_MARKER_COUNT_JS = """
+(sels) => {
+  for (const sel of sels) {
+    try {
+      const n = document.querySelectorAll(sel).length;
+      if (n) return n;
+    } catch (e) {}
+  }
+  return 0;
+}
+"""
 
-async def _scrape_async(
-    address: str,
-    zoom: int,
-    categories: Optional[List[str]],
-    headless: bool,
-    max_count: Optional[int],
-    logger: logging.Logger,
-) -> ScrapeResult:
-    """Asynchronous core scraping routine.
+# [data-lat, data-lng | data-lon] for each marker element handle.
+_MARKER_COORDS_JS = """
+(markers) => markers.map((m) => [
+  m.getAttribute("data-lat"),
+  m.getAttribute("data-lng") || m.getAttribute("data-lon"),
+])
+"""
 
-    This function is intended to be executed inside an asyncio event
-    loop.  It performs all browser automation using Playwright's
-    asynchronous API.  A synchronous wrapper is provided by
-    `scrape_locations` which invokes this coroutine via
-    `asyncio.run()`.
-    """
-    logs: List[str] = []
+# True once the marker count differs from ``before`` and has stopped
+# changing between two polls, i.e. the search results finished drawing.
+_MARKERS_SETTLED_JS = """
+([sels, before]) => {
+  let n = 0;
+  for (const sel of sels) {
+    try { n = document.querySelectorAll(sel).length; } catch (e) { n = 0; }
+    if (n) break;
+  }
+  const settled = n > 0 && n !== before && n === window.__rokesumaMarkerCount;
+  window.__rokesumaMarkerCount = n;
+  return settled;
+}
+"""
 
-    def append_log(message: str) -> None:
-        """Helper to record a log line with timestamp."""
-        ts = datetime.datetime.now().strftime("%H:%M:%S")
-        entry = f"[{ts}] {message}"
-        logs.append(entry)
-        if logger:
-            logger.info(message)
+# True once the detail panel shows a store name other than ``prev``.
+_NAME_CHANGED_JS = """
+([sels, prev]) => {
+  for (const sel of sels) {
+    let el = null;
+    try { el = document.querySelector(sel); } catch (e) { continue; }
+    const text = el ? (el.innerText || "").trim() : "";
+    if (text) return text !== prev;
+  }
+  return false;
+}
+"""
 
-    # Use provided categories or fall back to default
-    category_list = categories or []
-    if not category_list:
-        category_list = DEFAULT_CATEGORIES
+# URL and map centre, used to tell when a search has moved the map.
+_MAP_STATE_JS = """
+() => {
+  let centre = null;
+  try {
+    const c = window.map.getCenter();
+    centre = [c.lat, c.lng];
+  } catch (e) {}
+  return [location.href, centre];
+}
+"""
 
-    # Ensure Chromium is available before launching Playwright
-    ensure_chromium(logger)
+# True once the URL or the map centre differs from ``[href, centre]``.
+_MAP_MOVED_JS = """
+([href, centre]) => {
+  if (location.href !== href) return true;
+  try {
+    const c = window.map.getCenter();
+    return !centre || c.lat !== centre[0] || c.lng !== centre[1];
+  } catch (e) {
+    return false;
+  }
+}
+"""
 
-    # Keep track of the origin coordinates after searching the centre
-    origin_lat: Optional[float] = None
-    origin_lng: Optional[float] = None
+# Output columns, in order.  Rows are accumulated column-wise (one list per
+# column) and handed to pandas as a dict of lists.
+_RESULT_COLUMNS = (
+    "店舗名", "電話番号", "住所", "営業時間", "緯度", "経度",
+    "距離_m", "距離_km", "カテゴリ", "取得時刻",
+)
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
-        context = await browser.new_context()
-        page = await context.new_page()
 
-        # Visit ロケスマ（※実運用では正しい公式URLに合わせて修正してください）
-        await page.goto("https://www.locationsmart.org/", timeout=60000)
-        append_log("Loaded ロケスマWEB")
+# Distances are computed for the whole frame once scraping is done
+_SCRAPED_COLUMNS = tuple(c for c in _RESULT_COLUMNS if not c.startswith("距離_"))
 
-        # Locate the map search input. We try a handful of selectors to
-        # improve resilience against UI changes.
-        search_selectors = [
-            "input[placeholder*='住所']",
-            "input[aria-label*='検索']",
-            "input[type='search']",
-            "input[type='text']",
-        ]
-        search_input = None
-        for sel in search_selectors:
-            try:
-                element = await page.query_selector(sel)
-                if element:
-                    search_input = element
-                    break
-            except Exception:
-                continue
 
-        # Enter the centre address to reposition the map (best-effort).
-        if search_input:
+def _empty_columns() -> Dict[str, List[Any]]:
+    return {name: [] for name in _SCRAPED_COLUMNS}
+
+
+# Upper bound on categories scraped at once, each in its own BrowserContext
+_MAX_PARALLEL_CATEGORIES = 4
+
+
+# Requests that never affect the extracted text.  Stylesheets are kept:
+# innerText and click targets depend on layout.
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+_BLOCKED_URL_PARTS = ("google-analytics", "googletagmanager", "doubleclick", "analytics")
+
+
+async def _block_heavy_requests(route: Any) -> None:
+    request = route.request
+    if request.resource_type in _BLOCKED_RESOURCE_TYPES or any(
+        part in request.url for part in _BLOCKED_URL_PARTS
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def _new_context(browser: Any) -> Any:
+    """Open a BrowserContext that skips images, fonts, media and trackers."""
+    # Service workers would bypass context.route, so keep them off
+    context = await browser.new_context(service_workers="block")
+    await context.route("**/*", _block_heavy_requests)
+    return context
+
+
+# Candidate search boxes, most specific first
+_SEARCH_INPUT_SELECTORS = [
+    "input[placeholder*='住所']",
+    "input[aria-label*='検索']",
+    "input[type='search']",
+    "input[type='text']",
+]
+
+# First element matched by the selectors in priority order (a joined
+# "a, b" query would pick by DOM order instead).
+_FIRST_MATCH_JS = """
+(sels) => {
+  for (const sel of sels) {
+    try {
+      const el = document.querySelector(sel);
+      if (el) return el;
+    } catch (e) {}
+  }
+  return null;
+}
+"""
+
+
+async def _find_search_input(page: Any) -> Optional[Any]:
+    """Return the map search box, trying a handful of selectors to
+    improve resilience against UI changes."""
+    try:
+        handle = await page.evaluate_handle(_FIRST_MATCH_JS, _SEARCH_INPUT_SELECTORS)
+    except Exception:
+        return None
+    return handle.as_element()
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(0.5), reraise=True)
+async def _goto_site(page: Any) -> None:
+    # Visit ロケスマ（※実運用では正しい公式URLに合わせて修正してください）
+    await page.goto("https://www.locationsmart.org/", timeout=60000)
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(0.5), reraise=True)
+async def _click_marker(marker: Any) -> None:
+    # Short per-attempt timeout: a detached marker fails fast instead of
+    # holding the category for Playwright's default 30 s
+    await marker.click(timeout=5000)
+
+
+async def _open_map(page: Any) -> Optional[Any]:
+    """Load ロケスマWEB in ``page`` and return its search input (or None)."""
+    await _goto_site(page)
+    return await _find_search_input(page)
+
+
+async def _centre_map(page: Any, search_input: Any, address: str) -> None:
+    """Enter the centre address to reposition the map."""
+    before = await page.evaluate(_MAP_STATE_JS)
+    await search_input.fill(address)
+    await search_input.press("Enter")
+    # Wait for the map to move, but no longer
+    try:
+        await page.wait_for_function(
+            _MAP_MOVED_JS, arg=before, polling=250, timeout=5000,
+        )
+    except Exception:
+        pass
+
+
+async def _scrape_category(
+    browser: Any,
+    semaphore: asyncio.Semaphore,
+    cat: str,
+    address: str,
+    max_count: Optional[int],
+    append_log: Any,
+) -> Dict[str, List[Any]]:
+    """Scrape every marker for one category in a fresh BrowserContext.
+
+    Each category gets its own context and page so several can run side
+    by side on one browser; ``semaphore`` bounds how many do so at once.
+    """
+    columns = _empty_columns()
+    async with semaphore:
+        context = await _new_context(browser)
+        try:
+            page = await context.new_page()
             try:
-                await search_input.fill(address)
-                await search_input.press("Enter")
-                append_log(f"Searched for centre address: {address}")
-                # Give the map a moment to update
-                await page.wait_for_timeout(2000)
-                origin_coords = parse_coords_from_url(page.url)
-                if origin_coords:
-                    origin_lat, origin_lng = origin_coords
-                    append_log(
-                        f"Origin coordinates resolved from URL: {origin_lat}, {origin_lng}"
-                    )
+                search_input = await _open_map(page)
             except Exception as e:
-                append_log(f"Failed to search centre address: {e}")
-        else:
-            append_log("Search input not found; proceeding without setting centre address")
-
-        all_rows: List[Dict[str, Any]] = []
+                append_log(f"Failed to load ロケスマWEB for category '{cat}': {e}")
+                return columns
+            if search_input:
+                try:
+                    await _centre_map(page, search_input, address)
+                except Exception as e:
+                    append_log(f"Failed to search centre address for '{cat}': {e}")
 
-        # Iterate through the selected categories.  The ロケスマ search
-        # input accepts both chain names and broader categories; after
-        # entering the value and confirming we expect the map to
-        # populate with markers corresponding to the selected category.
-        for cat in category_list:
-            # Clear the search input before typing a new category
+            # The ロケスマ search input accepts both chain names and broader
+            # categories; after entering the value and confirming we expect
+            # the map to populate with markers for the selected category.
             if search_input:
                 try:
+                    before = await page.evaluate(_MARKER_COUNT_JS, MARKER_SELECTORS)
                     await search_input.fill("")
                     await search_input.type(cat)
                     await search_input.press("Enter")
                     append_log(f"Selected category: {cat}")
-                    # Allow time for markers to load
-                    await page.wait_for_timeout(2000)
+                    # Wait until the markers have loaded, but no longer
+                    try:
+                        await page.wait_for_function(
+                            _MARKERS_SETTLED_JS, arg=[MARKER_SELECTORS, before],
+                            polling=250, timeout=5000,
+                        )
+                    except Exception:
+                        pass
                 except Exception as e:
                     append_log(f"Failed to search category '{cat}': {e}")
 
             # Locate markers on the map.  Try each selector until we
             # find at least one candidate.  If none are found we log
-            # and continue with the next category.
+            # and give up on this category.
             marker_elements: List[Any] = []
             for msel in MARKER_SELECTORS:
                 try:
@@ -235,92 +524,84 @@ async def _scrape_async(
                     continue
             if not marker_elements:
                 append_log(f"No markers found for category '{cat}'")
-                continue
+                return columns
+
+            # Read every marker's data-lat/data-lng in one round-trip,
+            # aligned with marker_elements by index.
+            marker_coords: List[Any] = []
+            try:
+                marker_coords = await page.evaluate(_MARKER_COORDS_JS, marker_elements)
+            except Exception:
+                pass
 
             # Iterate over the markers.  For each marker click it,
             # extract details and append to the result list.  Respect
             # the max_count limit if provided.
             processed = 0
-            for marker in marker_elements:
+            last_name = ""
+            # Markers repeated within this category are dropped as they
+            # are found; overlap between categories is resolved after the
+            # gather so the earliest category wins deterministically.
+            seen: Set[str] = set()
+            # 取得時刻 has one-second resolution: format it at most once per
+            # second instead of once per row
+            stamp_second = -1
+            stamp = ""
+            for index, marker in enumerate(marker_elements):
                 if max_count and processed >= max_count:
                     break
                 try:
-                    await marker.click()
-                    # Wait a short while for the detail panel or popup
-                    await page.wait_for_timeout(800)
+                    await _click_marker(marker)
+                    # Wait for the detail panel or popup to show this
+                    # marker's store; give up after 2 s (e.g. same name)
+                    try:
+                        await page.wait_for_function(
+                            _NAME_CHANGED_JS, arg=[STORE_NAME_SELECTORS, last_name],
+                            timeout=2000,
+                        )
+                    except Exception:
+                        pass
 
-                    # Grab the entire visible text as a fallback
+                    # Read every detail field, the visible text and the map
+                    # centre in one round-trip: the first selector per field
+                    # with non-empty text wins.
+                    fields: Dict[str, Any] = {}
                     try:
-                        full_text = await page.inner_text("body")
+                        fields = await page.evaluate(
+                            _PICK_FIELDS_JS, [_FIELD_SELECTORS, PANEL_SELECTORS]
+                        ) or {}
                     except Exception:
-                        full_text = ""
-
-                    # Extract store name
-                    name: str = ""
-                    for sel in STORE_NAME_SELECTORS:
-                        try:
-                            elem = await page.query_selector(sel)
-                            if elem:
-                                text = (await elem.inner_text()).strip()
-                                if text:
-                                    name = text
-                                    break
-                        except Exception:
-                            continue
-
-                    # Extract address
-                    address_text: str = ""
-                    for sel in ADDRESS_SELECTORS:
-                        try:
-                            elem = await page.query_selector(sel)
-                            if elem:
-                                text = (await elem.inner_text()).strip()
-                                if text:
-                                    address_text = text
-                                    break
-                        except Exception:
-                            continue
-                    if not address_text:
-                        address_text = extract_address(full_text)
-
-                    # Extract phone
-                    phone_text: str = ""
-                    for sel in PHONE_SELECTORS:
-                        try:
-                            elem = await page.query_selector(sel)
-                            if elem:
-                                text = (await elem.inner_text()).strip()
-                                if text:
-                                    phone_text = text
-                                    break
-                        except Exception:
-                            continue
-                    phone = extract_phone(phone_text or full_text)
-
-                    # Extract hours
-                    hours_text: str = ""
-                    for sel in HOURS_SELECTORS:
-                        try:
-                            elem = await page.query_selector(sel)
-                            if elem:
-                                text = (await elem.inner_text()).strip()
-                                if text:
-                                    hours_text = text
-                                    break
-                        except Exception:
-                            continue
-                    hours = extract_hours(hours_text or full_text)
+                        pass
+                    # Panel (or page) text as a fallback
+                    full_text: str = fields.get("text", "")
+                    name: str = fields.get("name", "")
+                    address_text: str = fields.get("address", "")
+                    phone_text: str = fields.get("phone", "")
+                    hours_text: str = fields.get("hours", "")
+                    # One scan of the panel text covers whichever fields the
+                    # selectors missed.
+                    text_phone = text_address = text_hours = ""
+                    if not (address_text and phone_text and hours_text):
+                        text_phone, text_address, text_hours = extract_fields(full_text)
+                    address_text = address_text or text_address
+                    last_name = name
+                    # Skip repeats before doing any more work on them
+                    key = normalize_key(name, address_text)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    phone = extract_phone(phone_text) if phone_text else text_phone
+                    hours = extract_hours(hours_text) if hours_text else text_hours
 
                     # Attempt to resolve coordinates.
                     lat: Optional[float] = None
                     lng: Optional[float] = None
                     try:
-                        attr_lat = await marker.get_attribute("data-lat")
-                        attr_lng = await marker.get_attribute("data-lng") or await marker.get_attribute("data-lon")
+                        attr_lat, attr_lng = marker_coords[index]
                         if attr_lat and attr_lng:
                             lat = float(attr_lat)
                             lng = float(attr_lng)
-                    except Exception:
+                    except (IndexError, TypeError, ValueError):
                         pass
                     # Fallback 1: parse from the URL
                     if lat is None or lng is None:
@@ -330,54 +611,141 @@ async def _scrape_async(
                             append_log("[URL→coords] Coordinates resolved from URL")
                     # Fallback 2: use map centre via JS API if available
                     if lat is None or lng is None:
-                        try:
-                            centre = await page.evaluate(
-                                "(window.map && window.map.getCenter) ? [map.getCenter().lat, map.getCenter().lng] : null"
-                            )
-                            if centre:
+                        centre = fields.get("centre")
+                        if centre:
+                            try:
                                 lat, lng = float(centre[0]), float(centre[1])
                                 append_log("Using map centre as coordinate fallback")
-                        except Exception:
-                            pass
-
-                    # Compute distance from origin if possible
-                    dist_m: Optional[float] = None
-                    dist_km: Optional[float] = None
-                    if (
-                        lat is not None
-                        and lng is not None
-                        and origin_lat is not None
-                        and origin_lng is not None
-                    ):
-                        dm, dk = haversine_distance(origin_lat, origin_lng, lat, lng)
-                        dist_m = round(dm, 2)
-                        dist_km = round(dk, 3)
-
-                    row = {
-                        "店舗名": name,
-                        "電話番号": phone,
-                        "住所": address_text,
-                        "営業時間": hours,
-                        "緯度": lat,
-                        "経度": lng,
-                        "距離_m": dist_m,
-                        "距離_km": dist_km,
-                        "カテゴリ": cat,
-                        "取得時刻": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    }
-                    all_rows.append(row)
+                            except (TypeError, ValueError):
+                                pass
+
+                    now = time.time()
+                    if int(now) != stamp_second:
+                        stamp_second = int(now)
+                        stamp = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+                    row = (name, phone, address_text, hours, lat, lng, cat, stamp)
+                    for column, value in zip(columns.values(), row):
+                        column.append(value)
                     processed += 1
                 except Exception as e:
                     append_log(f"Error processing marker: {e}")
             append_log(f"Processed {processed} markers for category '{cat}'")
+        finally:
+            await context.close()
+    return columns
+
 
-        # Close browser
-        await browser.close()
+def _normalized_column(values: pd.Series) -> pd.Series:
+    """NFKC-normalise, lower-case and strip whitespace from a text column.
 
-    # Deduplicate results by name and address
-    unique_rows = unique_by_name_address(all_rows)
-    df = pd.DataFrame(unique_rows)
-    return ScrapeResult(dataframe=df, log_lines=logs)
+    Full-width and half-width spellings of the same name or address
+    (e.g. "ＡＢＣ　１－２" and "abc 1-2") map to the same value.
+    """
+    return (
+        values.fillna("").astype(str)
+        .str.normalize("NFKC")
+        .str.lower()
+        .str.replace(r"\s+", "", regex=True)
+    )
+
+
+async def _scrape_async(
+    address: str,
+    zoom: int,
+    categories: Optional[List[str]],
+    headless: bool,
+    max_count: Optional[int],
+    emit: Callable[[str], None],
+) -> ScrapeResult:
+    """Asynchronous core scraping routine.
+
+    This function runs on the shared Playwright event loop and performs
+    all browser automation using Playwright's asynchronous API.  A
+    synchronous wrapper is provided by `scrape_locations`, which submits
+    it to that loop.  Progress messages are handed to ``emit``; the
+    wrapper relays them to the caller's logger on the calling thread.
+    """
+    logs: List[Tuple[float, str]] = []
+
+    def append_log(message: str) -> None:
+        """Helper to record a log line; the timestamp is formatted lazily."""
+        logs.append((time.time(), message))
+        emit(message)
+
+    # Use provided categories or fall back to default
+    category_list = categories or []
+    if not category_list:
+        category_list = DEFAULT_CATEGORIES
+
+    # Keep track of the origin coordinates after searching the centre
+    origin_lat: Optional[float] = None
+    origin_lng: Optional[float] = None
+
+    browser = await _get_browser(headless)
+    # Resolve the origin once on a bootstrap page; each category
+    # then centres its own page on the same address.
+    context = await _new_context(browser)
+    try:
+        page = await context.new_page()
+        search_input = await _open_map(page)
+        append_log("Loaded ロケスマWEB")
+
+        # Enter the centre address to reposition the map (best-effort).
+        if search_input:
+            try:
+                await _centre_map(page, search_input, address)
+                append_log(f"Searched for centre address: {address}")
+                origin_coords = parse_coords_from_url(page.url)
+                if origin_coords:
+                    origin_lat, origin_lng = origin_coords
+                    append_log(
+                        f"Origin coordinates resolved from URL: {origin_lat}, {origin_lng}"
+                    )
+            except Exception as e:
+                append_log(f"Failed to search centre address: {e}")
+        else:
+            append_log("Search input not found; proceeding without setting centre address")
+    finally:
+        await context.close()
+
+    semaphore = asyncio.Semaphore(_MAX_PARALLEL_CATEGORIES)
+    per_category = await asyncio.gather(
+        *[
+            _scrape_category(
+                browser, semaphore, cat, address, max_count, append_log,
+            )
+            for cat in category_list
+        ]
+    )
+
+    # Rows are concatenated in category order, so "first" below still
+    # means the earliest selected category regardless of finish order.
+    merged = _empty_columns()
+    for part in per_category:
+        for name, values in part.items():
+            merged[name].extend(values)
+
+    # Distance from the origin for every row in one NumPy pass
+    n_rows = len(merged["店舗名"])
+    if origin_lat is not None and origin_lng is not None and n_rows:
+        dist_m, dist_km = haversine_distance_vector(
+            origin_lat, origin_lng, merged["緯度"], merged["経度"]
+        )
+        merged["距離_m"] = np.round(dist_m, 2)
+        merged["距離_km"] = np.round(dist_km, 3)
+    else:
+        merged["距離_m"] = [None] * n_rows
+        merged["距離_km"] = [None] * n_rows
+
+    # Deduplicate by normalised name and address and order by distance from
+    # the centre in vectorised passes over the frame rather than a Python loop.
+    df = pd.DataFrame(merged, columns=list(_RESULT_COLUMNS))
+    if not df.empty:
+        keys = _normalized_column(df["店舗名"]) + "\x1f" + _normalized_column(df["住所"])
+        df = df.loc[~keys.duplicated().to_numpy()].sort_values(
+            "距離_m", kind="stable", na_position="last", ignore_index=True
+        )
+    return ScrapeResult(dataframe=df, log_entries=logs)
 
 
 def scrape_locations(
@@ -386,7 +754,7 @@ def scrape_locations(
     categories: Optional[List[str]] = None,
     headless: bool = True,
     max_count: Optional[int] = None,
-    logger: Optional[logging.Logger] = None,
+    logger: Optional[Union[logging.Logger, logging.LoggerAdapter]] = None,
 ) -> ScrapeResult:
     """Synchronously scrape locations from ロケスマ.
 
@@ -405,7 +773,7 @@ def scrape_locations(
     max_count : int, optional
         Maximum number of markers to process per category.  Use 0 or
         ``None`` to process all markers.
-    logger : logging.Logger, optional
+    logger : logging.Logger or logging.LoggerAdapter, optional
         Logger instance for recording progress messages.  If None
         messages are stored in the returned log lines but not emitted
         elsewhere.
@@ -426,13 +794,45 @@ def scrape_locations(
         except Exception:
             pass
 
-    return asyncio.run(
+    log = logger or logging.getLogger(__name__)
+
+    # Ensure Chromium is available before launching Playwright
+    ensure_chromium(log)
+
+    # The coroutine runs on the shared loop thread.  Its progress messages
+    # are relayed here so the caller's logging handlers (e.g. a live view
+    # bound to the Streamlit script thread) run on the calling thread.
+    pending: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+    future = asyncio.run_coroutine_threadsafe(
         _scrape_async(
             address=address,
             zoom=zoom,
             categories=categories,
             headless=headless,
             max_count=max_count_norm,
-            logger=logger or logging.getLogger(__name__),
-        )
+            emit=pending.put,
+        ),
+        _event_loop(),
     )
+    try:
+        while True:
+            try:
+                message = pending.get(timeout=0.1)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            log.info("%s", message)
+        # Messages put after the last timed-out get() but before done()
+        # (typically the final "Processed N markers" line)
+        while True:
+            try:
+                message = pending.get_nowait()
+            except queue.Empty:
+                break
+            log.info("%s", message)
+    except BaseException:
+        # e.g. the Streamlit stop button: don't leave the scrape running
+        future.cancel()
+        raise
+    return future.result()
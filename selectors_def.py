@@ -10,7 +10,9 @@ order until it finds a match.
 
 Should the site change in the future you can update these lists
 without modifying the main scraping code.  When adding selectors
-remember to put more specific selectors earlier in the list.
+remember to put more specific selectors earlier in the list.  Entries
+are plain CSS; prefix an entry with `xpath=` for XPath, e.g. to match
+on text content, which CSS cannot do.
 """
 
 # Markers on the map.  These selectors should return a list of
@@ -53,8 +55,8 @@ PHONE_SELECTORS = [
     "div#storePanel .tel",
     "div.storePanel .tel",
     "div#detailPanel .tel",
-    "div#storePanel p:contains('電話')",
-    "div.storePanel p:contains('電話')"
+    "xpath=//div[@id='storePanel']//p[contains(., '電話')]",
+    "xpath=//div[contains(concat(' ', normalize-space(@class), ' '), ' storePanel ')]//p[contains(., '電話')]"
 ]
 
 # Candidate selectors for the opening hours.
@@ -63,8 +65,19 @@ HOURS_SELECTORS = [
     "div.storePanel .hour",
     "div#detailPanel .hour",
     "div.leaflet-popup-content .hour",
-    "div#storePanel p:contains('時間')",
-    "div.storePanel p:contains('時間')"
+    "xpath=//div[@id='storePanel']//p[contains(., '時間')]",
+    "xpath=//div[contains(concat(' ', normalize-space(@class), ' '), ' storePanel ')]//p[contains(., '時間')]"
+]
+
+# Containers of the detail panel or popup.  Their text is used for the
+# regular-expression fallbacks instead of the whole page.
+PANEL_SELECTORS = [
+    "div#storePanel",
+    "div.storePanel",
+    "div#detailPanel",
+    "div.leaflet-popup-content",
+    "div.gm-style-iw",
+    "[role='dialog']"
 ]
 
 
@@ -80,7 +93,7 @@ HOURS_SELECTORS = [
 # ここに追加してください。 重複を避けるため、1 行に 1 件ずつ
 # 記述し、アルファベット順やグループ順ではなく一般的な
 # 利用順に並べています。
-DEFAULT_CATEGORIES = [
+DEFAULT_CATEGORIES = (
     # 飲食店系
     "コンビニ",
     "カフェ",
@@ -230,4 +243,4 @@ DEFAULT_CATEGORIES = [
     "教会",
     "墓地",
     "霊園",
-]
\ No newline at end of file
+)
\ No newline at end of file
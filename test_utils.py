@@ -0,0 +1,142 @@
+"""Offline tests for the pure helpers in utils.py and the app's exports.
+
+Unlike the smoke tests these need neither a browser nor the network.
+"""
+
+import math
+import re
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import _column_widths, _extract_center, dataframe_to_excel_bytes
+from utils import (
+    extract_address,
+    extract_fields,
+    extract_hours,
+    extract_phone,
+    extract_postcode,
+    haversine_distance,
+    haversine_distance_vector,
+    normalize_key,
+    parse_coords_from_url,
+)
+
+
+def test_column_widths_all_none_column() -> None:
+    df = pd.DataFrame({"店舗名": ["A店", "B店"], "距離_m": [None, None]})
+    assert _column_widths(df) == [5, 6]
+
+
+def test_column_widths_empty_frame() -> None:
+    df = pd.DataFrame(columns=["店舗名", "距離_m"])
+    assert _column_widths(df) == [5, 6]
+
+
+def test_excel_export_without_origin() -> None:
+    df = pd.DataFrame(
+        {"店舗名": ["A店"], "距離_m": [None], "距離_km": [None]}
+    )
+    assert dataframe_to_excel_bytes(df).startswith(b"PK")
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("〒812-0012", "812-0012"),
+        ("812-0012", "812-0012"),
+        ("8120012", "812-0012"),
+        ("福岡市博多区 〒812-0012, 博多駅", "812-0012"),
+        ("〒812-0012。", "812-0012"),
+        ("", ""),
+        ("TEL 092-123-4567", ""),
+        ("33.5902123,130.4200123", ""),
+        ("1234567.89", ""),
+    ],
+)
+def test_extract_postcode(text: str, expected: str) -> None:
+    assert extract_postcode(text) == expected
+
+
+PANEL_TEXTS = [
+    "ABC店\n福岡県福岡市博多区博多駅中央街1-1\nTEL 092-123-4567\n営業時間 10時〜22時",
+    "営業時間 9:00-21:00\n電話 03-1234-5678\n東京都千代田区丸の内1-9-1",
+    "Open 9am - 5pm\r\n大阪市北区梅田3-1-1",
+    "no fields here\nat all",
+    "x" * 5000 + "\n市",
+    "name\rb市 1-2\r9時〜18時",
+    "",
+]
+
+
+@pytest.mark.parametrize("text", PANEL_TEXTS)
+def test_extract_fields_matches_individual_extractors(text: str) -> None:
+    expected = (extract_phone(text), extract_address(text), extract_hours(text))
+    assert extract_fields(text) == expected
+
+
+def _parse_coords_two_pass(url: str):
+    # The original implementation, kept as the reference for parity
+    if not url:
+        return None
+    decoded = urllib.parse.unquote(url)
+    decoded = decoded.replace("@ ", "@").replace(" @", "@")
+    m = re.search(r"@(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)", decoded)
+    if m:
+        return float(m.group(1)), float(m.group(2))
+    m = re.search(r"(?:ll|q)=(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)", decoded)
+    if m:
+        return float(m.group(1)), float(m.group(2))
+    return None
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.locationsmart.org/map/@33.5902,130.4200,13z",
+        "https://example.com/?ll=35.68,139.76&z=13",
+        "https://example.com/?q=-33.8,151.2",
+        "https://example.com/?ll=1.5,2&z=3@ 4,5",
+        "https://example.com/?q=1,2&ll=3,4",
+        "https://example.com/%4033.1%2C130.2",
+        "https://example.com/",
+        "",
+    ],
+)
+def test_parse_coords_matches_two_pass_version(url: str) -> None:
+    assert parse_coords_from_url(url) == _parse_coords_two_pass(url)
+
+
+def test_haversine_vector_matches_scalar() -> None:
+    lats = [33.5902, 35.6812, float("nan")]
+    lons = [130.4200, 139.7671, 130.0]
+    dist_m, dist_km = haversine_distance_vector(33.59, 130.42, lats, lons)
+    for i in range(2):
+        m, km = haversine_distance(33.59, 130.42, lats[i], lons[i])
+        assert math.isclose(dist_m[i], m, rel_tol=1e-9)
+        assert math.isclose(dist_km[i], km, rel_tol=1e-9)
+    assert np.isnan(dist_m[2]) and np.isnan(dist_km[2])
+
+
+def test_normalize_key() -> None:
+    assert normalize_key("ＡＢＣ　店", "福岡 １－２") == normalize_key("abc店", "福岡1-2")
+    assert normalize_key("㈱ABC", "x") == normalize_key("(株)abc", "x")
+    assert normalize_key(None, None) == "\x1f"
+    assert normalize_key("a", "b c") != normalize_key("a b", "c")
+
+
+@pytest.mark.parametrize(
+    "centre, expected",
+    [
+        ({"lat": 33.5, "lng": 130.4}, (33.5, 130.4)),
+        ({"lat": "33.5", "lng": "130.4"}, (33.5, 130.4)),
+        ({"latitude": 33.5, "longitude": 130.4}, (33.5, 130.4)),
+        ([33.5, 130.4], (33.5, 130.4)),
+        (None, (None, None)),
+        ({}, (None, None)),
+    ],
+)
+def test_extract_center(centre, expected) -> None:
+    assert _extract_center(centre) == expected
@@ -10,13 +10,40 @@ from __future__ import annotations
 
 import re
 import math
+import functools
+import unicodedata
 import urllib.parse
 from typing import Iterable, List, Dict, Optional, Tuple, Any
 
+import numpy as np
+
 
 # Regular expression patterns for phone numbers, addresses and hours.
 _PHONE_RE = re.compile(r"\d{2,4}-\d{2,4}-\d{3,4}")
-_POSTCODE_RE = re.compile(r"〒?\d{3}-\d{4}")
+# Not part of a longer number: no digit, '-' or decimal point before it,
+# and no digit, '-' or decimal/list continuation (".5", ",1") after it
+_POSTCODE_RE = re.compile(r"(?<![\d.-])〒?\s?(\d{3})-?(\d{4})(?![\d-]|[.,]\d)")
+# Coordinates in map URLs: `@lat,lng` and `ll=lat,lng` / `q=lat,lng`
+_COORDS_RE = re.compile(
+    r"@(?P<at_lat>-?\d+(?:\.\d+)?),(?P<at_lng>-?\d+(?:\.\d+)?)"
+    r"|(?:ll|q)=(?P<q_lat>-?\d+(?:\.\d+)?),(?P<q_lng>-?\d+(?:\.\d+)?)"
+)
+# Any one of the common address components marks an address line
+_ADDRESS_CHARS_RE = re.compile(r"[県府市区町村]")
+# Lines are delimited by \r and/or \n.  The line patterns are anchored at
+# line starts: unanchored, a miss would rescan the rest of the line from
+# every position (quadratic in the line length)
+_LINE_RE = re.compile(r"[^\r\n]+")
+_LINE_START = r"(?:^|(?<=\r))"
+_ADDRESS_LINE_RE = re.compile(
+    _LINE_START + r"[^\r\n]*[県府市区町村][^\r\n]*", re.MULTILINE
+)
+# '時' or AM/PM in any case marks an opening-hours line
+_HOURS_MARK_RE = re.compile(r"時|am|pm", re.IGNORECASE)
+_HOURS_LINE_RE = re.compile(
+    _LINE_START + r"[^\r\n]*(?:時|am|pm)[^\r\n]*", re.IGNORECASE | re.MULTILINE
+)
+_WHITESPACE_RE = re.compile(r"\s+")
 
 
 def extract_phone(text: str) -> str:
@@ -32,37 +59,78 @@ def extract_phone(text: str) -> str:
     return match.group(0) if match else ""
 
 
+def extract_postcode(text: str) -> str:
+    """Extract a Japanese postal code from the given text.
+
+    Matches `〒812-0012`, `812-0012` or `8120012` and returns it in the
+    canonical `xxx-xxxx` form.  If no postal code is found an empty
+    string is returned.
+    """
+    if not text:
+        return ""
+    match = _POSTCODE_RE.search(text)
+    return f"{match.group(1)}-{match.group(2)}" if match else ""
+
+
+def _is_address_line(line: str) -> bool:
+    return _ADDRESS_CHARS_RE.search(line) is not None
+
+
+def _is_hours_line(line: str) -> bool:
+    return _HOURS_MARK_RE.search(line) is not None
+
+
 def extract_address(text: str) -> str:
     """Attempt to extract an address from arbitrary text.
 
-    This function splits the text into lines and returns the first line
+    This function returns the first line of the text (stripped)
     containing common Japanese address components such as '県', '府',
     '市', '区', '町' or '村'.  If none of these tokens are present
     the function returns an empty string.
     """
     if not text:
         return ""
-    lines = text.splitlines()
-    for line in lines:
-        stripped = line.strip()
-        if any(tok in stripped for tok in ["県", "府", "市", "区", "町", "村"]):
-            return stripped
-    return ""
+    match = _ADDRESS_LINE_RE.search(text)
+    return match.group(0).strip() if match else ""
 
 
 def extract_hours(text: str) -> str:
     """Attempt to extract opening hours from text.
 
     The function looks for lines containing the character '時' which is
-    often present in Japanese time ranges.  If multiple lines match
-    the first is returned.
+    often present in Japanese time ranges, or AM/PM in any case.  If
+    multiple lines match the first is returned (stripped).
     """
     if not text:
         return ""
-    for line in text.splitlines():
-        if "時" in line or "AM" in line.upper() or "PM" in line.upper():
-            return line.strip()
-    return ""
+    match = _HOURS_LINE_RE.search(text)
+    return match.group(0).strip() if match else ""
+
+
+def extract_fields(text: str) -> Tuple[str, str, str]:
+    """Extract ``(phone, address, hours)`` from text in a single pass.
+
+    Equivalent to calling :func:`extract_phone`, :func:`extract_address`
+    and :func:`extract_hours` on the same text, but the lines are walked
+    once and the walk stops as soon as all three have been found.
+    """
+    phone = address = hours = ""
+    if not text:
+        return phone, address, hours
+    for line in _LINE_RE.findall(text):
+        if not phone:
+            match = _PHONE_RE.search(line)
+            if match:
+                phone = match.group(0)
+        if not address:
+            stripped = line.strip()
+            if _is_address_line(stripped):
+                address = stripped
+        if not hours and _is_hours_line(line):
+            hours = line.strip()
+        if phone and address and hours:
+            break
+    return phone, address, hours
 
 
 def parse_coords_from_url(url: str) -> Optional[Tuple[float, float]]:
@@ -76,25 +144,21 @@ def parse_coords_from_url(url: str) -> Optional[Tuple[float, float]]:
     """
     if not url:
         return None
-    # Unquote percent encoded parts and normalise the separator
-    decoded = urllib.parse.unquote(url)
+    # Unquote percent encoded parts and normalise the separator; both
+    # steps are skipped when there is nothing for them to change
+    decoded = urllib.parse.unquote(url) if "%" in url else url
     # Normalise stray spaces around the @ symbol
-    decoded = decoded.replace("@ ", "@").replace(" @", "@")
-    # Pattern 1: @lat,lng
-    m = re.search(r"@(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)", decoded)
-    if m:
-        try:
-            return float(m.group(1)), float(m.group(2))
-        except ValueError:
-            pass
-    # Pattern 2: ll=lat,lng or q=lat,lng
-    m = re.search(r"(?:ll|q)=(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)", decoded)
-    if m:
-        try:
-            return float(m.group(1)), float(m.group(2))
-        except ValueError:
-            pass
-    return None
+    if "@ " in decoded or " @" in decoded:
+        decoded = decoded.replace("@ ", "@").replace(" @", "@")
+    # One scan for both forms; `@lat,lng` wins over ll=/q= wherever
+    # it appears, so keep the first query match only as a fallback.
+    query: Optional[Tuple[float, float]] = None
+    for m in _COORDS_RE.finditer(decoded):
+        if m.group("at_lat") is not None:
+            return float(m.group("at_lat")), float(m.group("at_lng"))
+        if query is None:
+            query = float(m.group("q_lat")), float(m.group("q_lng"))
+    return query
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> Tuple[float, float]:
@@ -119,18 +183,59 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> Tu
         return 0.0, 0.0
 
 
+def haversine_distance_vector(
+    lat1: float, lon1: float, lat2: np.ndarray, lon2: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorised :func:`haversine_distance` from one point to many.
+
+    ``lat2`` and ``lon2`` are array-likes of equal length.  Distances are
+    returned as two float arrays in metres and kilometres; entries with a
+    missing (NaN) coordinate come back as NaN.
+    """
+    phi1 = math.radians(lat1)
+    phi2 = np.radians(np.asarray(lat2, dtype=float))
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2, dtype=float) - lon1)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    distance_m = 6371000.0 * c
+    return distance_m, distance_m / 1000.0
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalise, lower-case and remove whitespace from text.
+
+    Full-width and half-width spellings of the same string compare equal
+    after normalisation.  ``None`` is treated as an empty string.
+    """
+    if not text:
+        return ""
+    return _normalize_cached(text)
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_cached(text: str) -> str:
+    # Store names and addresses recur across markers and categories
+    return _WHITESPACE_RE.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def normalize_key(name: str, address: str) -> str:
+    """Return the deduplication key for a store name and address."""
+    return normalize_text(name) + "\x1f" + normalize_text(address)
+
+
 def unique_by_name_address(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Deduplicate a list of result dictionaries by store name and address.
 
     Because ロケスマ can display the same facility multiple times when
-    searching different categories or when markers overlap, the key
-    `(店舗名, 住所)` is used to identify duplicates.  The first
-    occurrence of a given key is kept.
+    searching different categories or when markers overlap, the
+    normalised `(店舗名, 住所)` pair (see :func:`normalize_key`) is used
+    to identify duplicates.  The first occurrence of a given key is kept.
     """
-    seen: set[Tuple[str, str]] = set()
+    seen: set[str] = set()
     unique_rows: List[Dict[str, Any]] = []
     for row in rows:
-        key = (row.get("店舗名", ""), row.get("住所", ""))
+        key = normalize_key(row.get("店舗名", ""), row.get("住所", ""))
         if key not in seen:
             seen.add(key)
             unique_rows.append(row)